@@ -1,9 +1,24 @@
 # bot/bot.py
 import os
 import json
+import asyncio
 from telegram import Update
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes
 from config import BOT_TOKEN, OWNER_ID, CHANNEL_ID, DB_PATH
+from catalog import FileCatalog
+
+# Files shown per /files page and the most results /find will list.
+# Both are kept small enough to stay under Telegram's 4096 character message limit.
+FILES_PAGE_SIZE = 30
+FIND_MAX_RESULTS = 30
+MAX_NAME_LENGTH = 100
+# Telegram accepts at most 100 message IDs per copyMessages call.
+COPY_BATCH_SIZE = 100
+# Telegram rejects messages longer than this many characters.
+MAX_MESSAGE_LENGTH = 4096
+
+catalog = FileCatalog(DB_PATH)
 
 # Create file_db.json if it doesn't exist
 def init_file_db():
@@ -28,18 +43,62 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "🤖 Welcome to Telegram Cloud!\n\n"
         "Use /upload to upload a file via desktop app\n"
-        "Use /files to view uploaded files\n"
+        "Use /files [page] to view uploaded files\n"
+        "Use /find <query> to search by name\n"
         "Use /download <name> to download a file"
     )
 
+def format_file_line(fname):
+    info = catalog.get(fname) or {}
+    if len(fname) > MAX_NAME_LENGTH:
+        fname = fname[:MAX_NAME_LENGTH - 1] + "…"
+    size_bytes = info.get("file_size_bytes")
+    if size_bytes is None:
+        return f"- {fname}"
+    return f"- {fname} ({size_bytes / (1024 * 1024):.2f} MB)"
+
 async def files(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    file_db = load_file_db()
-    if not file_db:
+    catalog.refresh()
+    if not len(catalog):
         await update.message.reply_text("📂 No files uploaded yet.")
         return
 
-    file_list = "\n".join(f"- {fname}" for fname in file_db)
-    await update.message.reply_text(f"📦 Uploaded files:\n{file_list}")
+    try:
+        page_number = int(context.args[0]) if context.args else 1
+    except ValueError:
+        page_number = 0
+    if page_number < 1:
+        await update.message.reply_text("⚠️ Page must be a number from 1 up.\nExample: /files 2")
+        return
+
+    names, total_pages = catalog.page(page_number, FILES_PAGE_SIZE)
+    if not names:
+        await update.message.reply_text(f"⚠️ There are only {total_pages} pages.")
+        return
+
+    file_list = "\n".join(format_file_line(fname) for fname in names)
+    footer = f"\n\nPage {page_number}/{total_pages} ({len(catalog)} files)"
+    if page_number < total_pages:
+        footer += f" — /files {page_number + 1} for more"
+    await update.message.reply_text(f"📦 Uploaded files:\n{file_list}{footer}")
+
+async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if len(context.args) == 0:
+        await update.message.reply_text("⚠️ Please provide a search term.\nExample: /find backup")
+        return
+
+    catalog.refresh()
+    query = " ".join(context.args)
+    matches = catalog.search(query)
+    if not matches:
+        await update.message.reply_text(f"🔍 No files matching '{query}'.")
+        return
+
+    file_list = "\n".join(format_file_line(fname) for fname in matches[:FIND_MAX_RESULTS])
+    footer = ""
+    if len(matches) > FIND_MAX_RESULTS:
+        footer = f"\n\nShowing {FIND_MAX_RESULTS} of {len(matches)} matches. Try a longer query."
+    await update.message.reply_text(f"🔍 Files matching '{query}':\n{file_list}{footer}")
 
 async def upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
@@ -47,12 +106,129 @@ async def upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Make sure your bot token and channel ID are set correctly."
     )
 
+def is_owner(update: Update):
+    return bool(OWNER_ID) and str(update.effective_user.id) == str(OWNER_ID)
+
+def stored_parts(info):
+    """
+    Returns (parts_by_channel, holes, recorded_parts) for a catalog entry written
+    by either the bot or the user uploader. parts_by_channel maps each storage
+    channel to the message IDs of the parts kept there; holes lists
+    (part_number, size_in_bytes) for the all-zero parts that were never stored.
+    """
+    holes = []
+    if "messages" in info:
+        records = info["messages"]
+        stored = [(m.get("channel_id", CHANNEL_ID), m["message_id"]) for m in records if not m.get("hole")]
+        holes = [(i + 1, m.get("size")) for i, m in enumerate(records) if m.get("hole")]
+    else:
+        records = info.get("message_ids", [])
+        # Entries from before sharding have every part in CHANNEL_ID
+        channels = info.get("channels") or [CHANNEL_ID] * len(records)
+        stored = [(channel_id, msg_id) for channel_id, msg_id in zip(channels, records) if msg_id is not None]
+        chunk_size = info.get("chunk_size")
+        for i, msg_id in enumerate(records):
+            if msg_id is None:
+                size = min(chunk_size, info["file_size_bytes"] - i * chunk_size) if chunk_size else None
+                holes.append((i + 1, size))
+
+    parts_by_channel = {}
+    for channel_id, msg_id in stored:
+        parts_by_channel.setdefault(channel_id, []).append(msg_id)
+    return parts_by_channel, holes, len(records)
+
+def format_holes(holes):
+    """One line per run of consecutive same-sized holes, e.g. 'parts 3-7: 19922944 bytes each'."""
+    runs = []
+    for part_number, size in holes:
+        if runs and runs[-1][1] == part_number - 1 and runs[-1][2] == size:
+            runs[-1][1] = part_number
+        else:
+            runs.append([part_number, part_number, size])
+    lines = []
+    for first, last, size in runs:
+        size_text = f"{size} bytes" if size is not None else "size unknown"
+        if first == last:
+            lines.append(f"part {first}: {size_text}")
+        else:
+            lines.append(f"parts {first}-{last}: {size_text} each")
+    return lines
+
 async def download(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_owner(update):
+        await update.message.reply_text("⛔ Only the owner can download files. Set OWNER_ID in bot/config.py.")
+        return
     if len(context.args) == 0:
         await update.message.reply_text("⚠️ Please provide the filename.\nExample: /download bigfile.zip")
-    else:
-        filename = " ".join(context.args)
-        await update.message.reply_text(f"⏬ Preparing `{filename}` for download...", parse_mode="Markdown")
+        return
+
+    filename = " ".join(context.args)
+    catalog.refresh()
+    info = catalog.get(filename)
+    if info is None:
+        await update.message.reply_text(f"❓ '{filename}' is not in the catalog. Try /find {filename}")
+        return
+
+    parts_by_channel, holes, recorded_parts = stored_parts(info)
+    part_count = sum(len(message_ids) for message_ids in parts_by_channel.values())
+    if recorded_parts < info.get("total_parts", 0):
+        await update.message.reply_text(f"⚠️ The upload of '{filename}' is incomplete ({recorded_parts}/{info['total_parts']} parts).")
+        return
+
+    await update.message.reply_text(f"⏬ Sending {part_count} parts of '{filename}'...")
+
+    # The parts are copied server-side from the storage channels; no file data passes
+    # through this host. copyMessages needs strictly increasing IDs, so parts uploaded
+    # concurrently (or to several channels) may arrive out of order; their captions
+    # carry the part number.
+    delivered = 0
+
+    async def copy_from_channel(channel_id, message_ids):
+        nonlocal delivered
+        message_ids = sorted(message_ids)
+        for start in range(0, len(message_ids), COPY_BATCH_SIZE):
+            batch = message_ids[start:start + COPY_BATCH_SIZE]
+            while True:
+                try:
+                    copied = await context.bot.copy_messages(
+                        chat_id=update.effective_chat.id,
+                        from_chat_id=channel_id,
+                        message_ids=batch
+                    )
+                    break
+                except RetryAfter as e:
+                    retry_after = e.retry_after
+                    if hasattr(retry_after, "total_seconds"):
+                        retry_after = retry_after.total_seconds()
+                    await asyncio.sleep(retry_after)
+            delivered += len(copied)
+
+    try:
+        # Each channel has its own flood limits, so they are copied from in parallel.
+        await asyncio.gather(*(
+            copy_from_channel(channel_id, message_ids)
+            for channel_id, message_ids in parts_by_channel.items()
+        ))
+    except TelegramError as e:
+        await update.message.reply_text(f"❌ Delivery stopped after {delivered} parts. Error: {e}")
+        return
+
+    summary = (f"✅ Delivered {delivered}/{part_count} parts of '{filename}'. Each part's caption"
+               f" ends in .partN; join the parts in that order.")
+    if delivered < part_count:
+        summary += "\nSome parts could not be found in the channel."
+    if holes:
+        summary += (f"\n{len(holes)} all-zero parts were never stored. Put a zero-filled file of the"
+                    f" listed size in each of their places when joining:")
+    # Long hole lists are split over several messages.
+    message = summary
+    for line in format_holes(holes):
+        if len(message) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            await update.message.reply_text(message)
+            message = line
+        else:
+            message += "\n" + line
+    await update.message.reply_text(message)
 
 if __name__ == "__main__":
     init_file_db()
@@ -60,6 +236,7 @@ if __name__ == "__main__":
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("files", files))
+    app.add_handler(CommandHandler("find", find))
     app.add_handler(CommandHandler("upload", upload))
     app.add_handler(CommandHandler("download", download))
 
@@ -0,0 +1,99 @@
+# bot/catalog.py
+import os
+import json
+import bisect
+
+class FileCatalog:
+    """
+    In-memory copy of file_db.json with a search index.
+
+    The file is only re-parsed when its mtime or size changes, so listing and
+    searching cost one stat() per command instead of a full JSON load.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.entries = {}
+        self.names = []       # Sorted case-insensitively
+        self._keys = []       # Lower-cased names, same order as self.names
+        self._trigrams = {}   # trigram -> set of indexes into self.names
+        self._stamp = None
+
+    def refresh(self):
+        """Reloads the catalog if the file changed since the last load."""
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            if self._stamp is not None:
+                self._load({})
+                self._stamp = None
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        try:
+            with open(self.db_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except json.JSONDecodeError:
+            # Probably caught mid-write; keep serving the last good copy.
+            print("Warning: Database file is corrupted or being written. Using cached catalog.")
+            return
+        self._load(entries)
+        self._stamp = stamp
+
+    def _load(self, entries):
+        self.entries = entries
+        self.names = sorted(entries, key=str.lower)
+        self._keys = [name.lower() for name in self.names]
+        self._trigrams = {}
+        for index, key in enumerate(self._keys):
+            for i in range(len(key) - 2):
+                self._trigrams.setdefault(key[i:i + 3], set()).add(index)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def page(self, page_number, page_size):
+        """Returns (names_on_page, total_pages). Pages are numbered from 1; others are empty."""
+        total_pages = max(1, -(-len(self.names) // page_size))
+        if page_number < 1:
+            return [], total_pages
+        start = (page_number - 1) * page_size
+        return self.names[start:start + page_size], total_pages
+
+    def search(self, query):
+        """Returns names starting with `query` first, then names containing it."""
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        # Prefix matches: a contiguous range of the sorted keys.
+        lo = bisect.bisect_left(self._keys, query)
+        hi = bisect.bisect_left(self._keys, query + "\uffff")
+        prefix_hits = list(range(lo, hi))
+
+        # Substring matches: narrow down with the trigram index, then confirm.
+        if len(query) >= 3:
+            # Intersect starting from the rarest trigram to keep the sets small.
+            trigram_sets = sorted(
+                (self._trigrams.get(query[i:i + 3], set()) for i in range(len(query) - 2)),
+                key=len,
+            )
+            candidates = set(trigram_sets[0])
+            for indexes in trigram_sets[1:]:
+                if not candidates:
+                    break
+                candidates &= indexes
+            candidates = sorted(candidates)
+        else:
+            candidates = range(len(self._keys))
+        prefix_set = set(prefix_hits)
+        substring_hits = [i for i in candidates if i not in prefix_set and query in self._keys[i]]
+
+        return [self.names[i] for i in prefix_hits + substring_hits]
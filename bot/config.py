@@ -4,3 +4,7 @@ BOT_TOKEN = ""
 OWNER_ID = ""
 CHANNEL_ID = ""
 DB_PATH = "file_db.json"
+
+# Optional: several storage channels to spread parts across (leave empty to use CHANNEL_ID only).
+# Must match CHANNEL_IDS in client/config.py.
+CHANNEL_IDS = []
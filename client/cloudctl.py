@@ -0,0 +1,149 @@
+# client/cloudctl.py
+# Thin front end for client/daemon.py. It only uses the standard library, so it
+# starts instantly; the daemon holds the Telegram sessions and does the work.
+import os
+import sys
+import json
+import time
+import fcntl
+import socket
+import argparse
+import subprocess
+
+# --- CONFIGURATION & CONSTANTS ---
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Must match SOCKET_PATH and LOCK_PATH in client/daemon.py
+SOCKET_PATH = os.path.join(CLIENT_DIR, "daemon.sock")
+LOCK_PATH = os.path.join(CLIENT_DIR, "daemon.lock")
+DAEMON_SCRIPT = os.path.join(CLIENT_DIR, "daemon.py")
+LOG_PATH = os.path.join(CLIENT_DIR, "daemon.log")
+# Connecting both sessions can take a while on a slow network.
+START_TIMEOUT = 120
+
+# --- IPC ---
+def send_job(job, timeout=None):
+    """Sends one job to the daemon and returns its decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SOCKET_PATH)
+        sock.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise ConnectionError("The daemon closed the connection without a response.")
+    return json.loads(data)
+
+def is_running():
+    """True while a daemon holds its lock, even if a long job keeps it from answering."""
+    with open(LOCK_PATH, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return False
+
+def is_responding():
+    try:
+        return send_job({"op": "ping"}, timeout=2).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+def start_daemon():
+    if is_running():
+        print("Daemon is already running.")
+        return True
+
+    print(f"Starting daemon (log: {LOG_PATH})...")
+    with open(LOG_PATH, 'ab') as log:
+        # -u: unbuffered output, so the log is written as things happen
+        subprocess.Popen(
+            [sys.executable, "-u", DAEMON_SCRIPT],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if is_responding():
+            print("Daemon is running.")
+            return True
+        time.sleep(0.5)
+    print("Daemon did not come up in time. Check the log; the first login must be done by")
+    print("running 'python client/daemon.py' in a terminal once.")
+    return False
+
+# --- COMMANDS ---
+def run_command(args):
+    if args.command == "start":
+        return 0 if start_daemon() else 1
+
+    if args.command == "status":
+        if not is_running():
+            print("Daemon is not running.")
+        elif is_responding():
+            print("Daemon is running.")
+        else:
+            print("Daemon is running (busy with a job or still connecting).")
+        return 0
+
+    if not is_running():
+        print("Daemon is not running. Start it with: python client/cloudctl.py start")
+        return 1
+
+    if args.command == "stop":
+        job = {"op": "shutdown"}
+    elif args.command == "list":
+        job = {"op": "list"}
+    elif args.command == "upload":
+        job = {"op": "upload", "method": args.method, "path": os.path.abspath(args.path)}
+    elif args.command == "download":
+        job = {"op": "download", "method": args.method, "name": args.name}
+    else:
+        print(f"Unknown command '{args.command}'")
+        return 1
+
+    response = send_job(job)
+    if not response.get("ok"):
+        print(f"Error: {response.get('error')}")
+        return 1
+
+    result = response["result"]
+    if args.command == "list":
+        if not result:
+            print("No files uploaded yet.")
+        for info in result:
+            size_mb = info["file_size_bytes"] / (1024 * 1024)
+            print(f"  {info['name']} ({size_mb:.2f} MB, {info['total_parts']} parts, {info['upload_method']})")
+    elif args.command == "upload":
+        print(f"✅ Uploaded '{args.path}' ({result.get('total_parts')} parts).")
+    elif args.command == "download":
+        print(f"✅ Downloaded to '{result}'.")
+    else:
+        print(result)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Control the Telegram Cloud Backup transfer daemon.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("start", help="Start the daemon in the background")
+    sub.add_parser("stop", help="Stop the daemon")
+    sub.add_parser("status", help="Check whether the daemon is running")
+    sub.add_parser("list", help="List files in the catalog")
+    up = sub.add_parser("upload", help="Upload a file")
+    up.add_argument("path")
+    up.add_argument("--method", choices=("user", "bot"), default="user")
+    down = sub.add_parser("download", help="Download a file by name")
+    down.add_argument("name")
+    down.add_argument("--method", choices=("user", "bot"), default="user")
+
+    sys.exit(run_command(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
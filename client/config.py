@@ -13,3 +13,8 @@ API_HASH = "" # Replace with your string API Hash
 # It should be the numerical ID (e.g., -1001234567890)
 CHANNEL_ID =  # Replace with your Channel ID
 
+# --- OPTIONAL: Multiple storage channels ---
+# List several private channel IDs here to spread parts across them. This shares
+# the traffic and flood limits between channels and keeps each history smaller.
+# Leave it empty to store everything in CHANNEL_ID. Use the same list as in bot/config.py.
+CHANNEL_IDS = []
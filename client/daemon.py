@@ -0,0 +1,179 @@
+# client/daemon.py
+import os
+import sys
+import json
+import fcntl
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# This allows the script to find our other project modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import telebot
+from telethon import TelegramClient
+
+from client import uploader_user, uploader_bot, downloader, downloader_bot
+from client.config import API_ID, API_HASH
+from bot.config import BOT_TOKEN
+
+# --- CONFIGURATION & CONSTANTS ---
+# Must match SOCKET_PATH and LOCK_PATH in client/cloudctl.py
+SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon.sock")
+# Held (flock) for as long as a daemon runs, even while a job keeps it from answering.
+LOCK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon.lock")
+# Threads for the blocking bot-method jobs. Each keeps its own warm HTTP session.
+BOT_JOB_THREADS = 4
+
+def acquire_lock():
+    """Takes the daemon lock. Returns the open lock file, or None if another daemon holds it."""
+    lock_file = open(LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+class TransferDaemon:
+    """Keeps the user and bot sessions connected and runs jobs sent over the Unix socket."""
+
+    def __init__(self):
+        self.user_client = None
+        self.bot = None
+        self.executor = ThreadPoolExecutor(max_workers=BOT_JOB_THREADS)
+        # Uploads do a read-modify-write of the catalog, so only one runs at a time.
+        self.upload_lock = asyncio.Lock()
+        self.stop_event = asyncio.Event()
+
+    async def connect(self):
+        """Logs in once. A method that fails to connect is reported and left unavailable."""
+        loop = asyncio.get_running_loop()
+
+        print("Connecting to Telegram as user...")
+        try:
+            client = TelegramClient(uploader_user.SESSION_NAME, API_ID, API_HASH, connection_retries=5)
+            await client.start()
+            self.user_client = client
+            print("User session connected.")
+        except Exception as e:
+            print(f"Warning: User method unavailable. Error: {e}")
+
+        try:
+            bot = telebot.TeleBot(BOT_TOKEN)
+            await loop.run_in_executor(self.executor, bot.get_me)
+            self.bot = bot
+            print("Bot connection successful.")
+        except Exception as e:
+            print(f"Warning: Bot method unavailable. Error: {e}")
+
+    def _require(self, method):
+        if method == "user" and self.user_client is None:
+            raise RuntimeError("User method is not connected in the daemon.")
+        if method == "bot" and self.bot is None:
+            raise RuntimeError("Bot method is not connected in the daemon.")
+        if method not in ("user", "bot"):
+            raise ValueError(f"Unknown method '{method}'. Use 'user' or 'bot'.")
+
+    async def run_job(self, job):
+        """Runs one job and returns its result. Raises on failure."""
+        loop = asyncio.get_running_loop()
+        op = job.get("op")
+        method = job.get("method", "user")
+
+        if op == "ping":
+            return "pong"
+
+        if op == "list":
+            db = uploader_bot.load_db()
+            return [
+                {
+                    "name": name,
+                    "file_size_bytes": info.get("file_size_bytes", 0),
+                    "total_parts": info.get("total_parts", 0),
+                    "upload_method": info.get("upload_method", "user"),
+                }
+                for name, info in db.items()
+            ]
+
+        if op == "upload":
+            file_path = job["path"]
+            self._require(method)
+            async with self.upload_lock:
+                if method == "user":
+                    uploaded = await uploader_user.upload_file_main(self.user_client, file_path, interactive=False)
+                else:
+                    uploaded = await loop.run_in_executor(self.executor, uploader_bot.upload_file_bot, file_path, self.bot, False)
+            if not uploaded:
+                raise RuntimeError(f"Upload of '{file_path}' did not complete. See the daemon log.")
+            return uploader_bot.load_db()[os.path.basename(file_path)]
+
+        if op == "download":
+            name = job["name"]
+            self._require(method)
+            db = uploader_bot.load_db()
+            if name not in db:
+                raise ValueError(f"'{name}' is not in the catalog.")
+            if method == "user":
+                output_path = await downloader.download_file_main(self.user_client, name, db)
+            else:
+                output_path = await loop.run_in_executor(self.executor, downloader_bot.download_file_main, name, db)
+            if not output_path:
+                raise RuntimeError(f"Download of '{name}' failed. See the daemon log.")
+            return os.path.abspath(output_path)
+
+        if op == "shutdown":
+            self.stop_event.set()
+            return "stopping"
+
+        raise ValueError(f"Unknown op '{op}'")
+
+    async def handle_connection(self, reader, writer):
+        """One newline-terminated JSON job in, one JSON response line out."""
+        try:
+            line = await reader.readline()
+            job = json.loads(line)
+            response = {"ok": True, "result": await self.run_job(job)}
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        try:
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        lock_file = acquire_lock()
+        if lock_file is None:
+            print("Another daemon is already running. Exiting.")
+            return
+        await self.connect()
+
+        # We hold the lock, so a socket left behind belongs to a daemon that has exited.
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        # The socket is created owner-only from the start, so no one else can connect
+        old_umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self.handle_connection, path=SOCKET_PATH)
+        finally:
+            os.umask(old_umask)
+        print(f"Daemon listening on {SOCKET_PATH}")
+
+        try:
+            await self.stop_event.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(SOCKET_PATH):
+                os.remove(SOCKET_PATH)
+            if self.user_client is not None:
+                await self.user_client.disconnect()
+            self.executor.shutdown(wait=False)
+            lock_file.close()
+            print("Daemon stopped.")
+
+async def main():
+    await TransferDaemon().serve()
+
+if __name__ == "__main__":
+    asyncio.run(main())
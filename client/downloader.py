@@ -17,13 +17,18 @@ except ImportError:
     print("Could not import client/config.py. Please create it and add your API credentials.")
     sys.exit(1)
 
+from utils.file_utils import copy_file_into
+from utils.telegram_api import part_channel
+
 # --- CONFIGURATION & CONSTANTS ---
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
 SESSION_NAME = "telegram_user_session"
 DOWNLOAD_FOLDER = "downloads"
 # --- SPEED OPTIMIZATION ---
-# Number of chunks to download at the same time.
+# Number of chunks to download at the same time from each storage channel.
 CONCURRENT_DOWNLOADS = 4
+# Part size used by the user uploader, for catalog entries that don't record one.
+DEFAULT_CHUNK_SIZE = int(2000 * 1024 * 1024)
 
 # --- DATABASE FUNCTIONS ---
 def load_db():
@@ -37,21 +42,28 @@ def load_db():
             return None
 
 # --- Self-Contained Join Function ---
-def join_files_here(parts_list, output_file):
+def join_files_here(parts_list, output_file, chunk_size, file_size):
     """
     Joins a list of file parts into a single output file.
+    Parts given as None are holes: nothing is written for them, so they
+    stay sparse regions in the output.
     """
     print("\nJoining parts...")
-    with open(output_file, 'wb') as outfile:
-        for part_path in tqdm(parts_list, desc="Joining"):
-            with open(part_path, 'rb') as part_file:
-                outfile.write(part_file.read())
+    out_fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        for part_index, part_path in enumerate(tqdm(parts_list, desc="Joining")):
+            if part_path is not None:
+                copy_file_into(part_path, out_fd, part_index * chunk_size)
+        # Extending to the full size keeps trailing holes sparse too.
+        os.ftruncate(out_fd, file_size)
+    finally:
+        os.close(out_fd)
     return output_file
 
 # --- CORE DOWNLOAD LOGIC ---
-async def download_worker(client, msg_id, part_path, pbar_chunk):
+async def download_worker(client, channel_id, msg_id, part_path, pbar_chunk):
     """A worker that downloads a single file part."""
-    message = await client.get_messages(CHANNEL_ID, ids=msg_id)
+    message = await client.get_messages(channel_id, ids=msg_id)
     if not message or not message.document:
         print(f"\nWarning: Could not find document for message ID {msg_id}. Skipping.")
         return None
@@ -72,46 +84,58 @@ async def download_file_main(client, file_to_download, db):
     file_info = db[file_to_download]
     message_ids = file_info["message_ids"]
     total_parts = file_info["total_parts"]
+    chunk_size = file_info.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    hole_count = sum(1 for msg_id in message_ids if msg_id is None)
     
     print(f"Starting download for '{file_to_download}' which has {total_parts} parts.")
-    print(f"Downloading with up to {CONCURRENT_DOWNLOADS} connections at once.")
+    print(f"Downloading with up to {CONCURRENT_DOWNLOADS} connections per channel.")
 
     temp_download_dir = os.path.join(DOWNLOAD_FOLDER, f"{file_to_download}_parts")
     os.makedirs(temp_download_dir, exist_ok=True)
     
-    semaphore = asyncio.Semaphore(CONCURRENT_DOWNLOADS)
+    # Each storage channel gets its own slots, so parts spread over several
+    # channels download in parallel.
+    semaphores = {}
     tasks = []
+    downloaded_parts_paths = []
 
     async def task_creator(msg_id, part_index):
+        channel_id = part_channel(file_info, part_index, CHANNEL_ID)
+        semaphore = semaphores.setdefault(channel_id, asyncio.Semaphore(CONCURRENT_DOWNLOADS))
         async with semaphore:
             part_path = os.path.join(temp_download_dir, str(part_index))
             pbar_chunk = tqdm(total=0, unit='B', unit_scale=True, desc=f"Part {part_index+1}")
             # We don't know the size yet, so we'll update it later
             
-            return await download_worker(client, msg_id, part_path, pbar_chunk)
+            return part_index, await download_worker(client, channel_id, msg_id, part_path, pbar_chunk)
 
     try:
         for i, msg_id in enumerate(message_ids):
+            # Holes (all-zero parts) were never uploaded; they are recreated as sparse regions.
+            if msg_id is None:
+                continue
             tasks.append(task_creator(msg_id, i))
 
-        downloaded_parts_paths = await asyncio.gather(*tasks)
-        # Filter out any None results from skipped parts
-        downloaded_parts_paths = [path for path in downloaded_parts_paths if path is not None]
+        results = await asyncio.gather(*tasks)
+        # Keep parts in their positions; holes and skipped parts stay None
+        downloaded_parts_paths = [None] * total_parts
+        for part_index, path in results:
+            downloaded_parts_paths[part_index] = path
+        parts_ok = sum(1 for path in downloaded_parts_paths if path is not None)
 
-        if len(downloaded_parts_paths) != total_parts:
-            print(f"\nError: Download failed. Expected {total_parts} parts, but only got {len(downloaded_parts_paths)}. Aborting.")
+        if parts_ok + hole_count != total_parts:
+            print(f"\nError: Download failed. Expected {total_parts - hole_count} parts, but only got {parts_ok}. Aborting.")
             return
 
         print("\nAll parts downloaded successfully. Now joining them...")
         
         os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
         final_output_path = os.path.join(DOWNLOAD_FOLDER, file_to_download)
-        
-        downloaded_parts_paths.sort(key=lambda x: int(os.path.basename(x)))
 
-        join_files_here(downloaded_parts_paths, final_output_path)
+        join_files_here(downloaded_parts_paths, final_output_path, chunk_size, file_info["file_size_bytes"])
 
         print(f"\n✅ Success! File '{file_to_download}' has been reassembled in the '{DOWNLOAD_FOLDER}' directory.")
+        return final_output_path
 
     except Exception as e:
         print(f"\n---FATAL DOWNLOAD ERROR---")
@@ -17,6 +17,8 @@ except ImportError:
     print("Could not import bot/config.py. Please create it and add your BOT_TOKEN.")
     sys.exit(1)
 
+from utils.file_utils import copy_file_into
+
 # --- CONFIGURATION & CONSTANTS ---
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
 DOWNLOAD_FOLDER = "downloads"
@@ -25,6 +27,14 @@ DOWNLOAD_FOLDER = "downloads"
 CONCURRENT_DOWNLOADS = 25
 # Number of times to retry a failed part download
 DOWNLOAD_RETRIES = 5
+# Part size used by the bot uploader, for catalog entries that don't record one.
+DEFAULT_CHUNK_SIZE = int(19 * 1024 * 1024)
+
+# --- HTTP SESSION ---
+# One pooled session shared by all workers, so connections to the Bot API are
+# reused across parts (and across jobs when running inside client/daemon.py).
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=CONCURRENT_DOWNLOADS))
 
 # --- DATABASE FUNCTIONS ---
 def load_db():
@@ -38,12 +48,18 @@ def load_db():
             return None
 
 # --- Self-Contained Join Function ---
-def join_files_here(parts_list, output_file):
+def join_files_here(parts_list, output_file, chunk_size, file_size):
+    """Joins the parts in order; None entries are holes and are left sparse."""
     print("\nJoining parts...")
-    with open(output_file, 'wb') as outfile:
-        for part_path in tqdm(parts_list, desc="Joining"):
-            with open(part_path, 'rb') as part_file:
-                outfile.write(part_file.read())
+    out_fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        for part_index, part_path in enumerate(tqdm(parts_list, desc="Joining")):
+            if part_path is not None:
+                copy_file_into(part_path, out_fd, part_index * chunk_size)
+        # Extending to the full size keeps trailing holes sparse too.
+        os.ftruncate(out_fd, file_size)
+    finally:
+        os.close(out_fd)
     return output_file
 
 # --- NEW: Worker function with robust exponential backoff retry logic ---
@@ -53,7 +69,7 @@ def download_part_worker(bot_token, file_id, part_path):
     for attempt in range(DOWNLOAD_RETRIES):
         try:
             # Get file path from Telegram with a longer timeout
-            file_info_from_api = requests.get(f"https://api.telegram.org/bot{bot_token}/getFile?file_id={file_id}", timeout=30).json()
+            file_info_from_api = HTTP_SESSION.get(f"https://api.telegram.org/bot{bot_token}/getFile?file_id={file_id}", timeout=30).json()
             
             if not file_info_from_api.get('ok'):
                 description = file_info_from_api.get('description', 'Unknown API Error')
@@ -68,7 +84,7 @@ def download_part_worker(bot_token, file_id, part_path):
             file_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path_on_server}"
             
             # Stream the download with a generous timeout
-            response = requests.get(file_url, stream=True, timeout=120)
+            response = HTTP_SESSION.get(file_url, stream=True, timeout=120)
             response.raise_for_status() # Raise an exception for bad status codes (like 404, 500)
             
             with open(part_path, 'wb') as f:
@@ -99,6 +115,8 @@ def download_file_main(file_to_download, db):
         return
 
     total_parts = file_info["total_parts"]
+    chunk_size = file_info.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    hole_count = sum(1 for msg_info in messages if msg_info.get('hole'))
     
     print(f"Starting download for '{file_to_download}' which has {total_parts} parts.")
     print(f"Using up to {CONCURRENT_DOWNLOADS} concurrent connections.")
@@ -107,11 +125,15 @@ def download_file_main(file_to_download, db):
     os.makedirs(temp_download_dir, exist_ok=True)
     
     downloaded_parts_paths = []
+    parts_by_index = [None] * total_parts
 
     try:
         with ThreadPoolExecutor(max_workers=CONCURRENT_DOWNLOADS) as executor:
-            future_to_part_path = {}
+            future_to_part_index = {}
             for i, msg_info in enumerate(messages):
+                # Holes (all-zero parts) were never uploaded; they are recreated as sparse regions.
+                if msg_info.get('hole'):
+                    continue
                 file_id = msg_info.get('file_id')
                 if not file_id:
                     print(f"Warning: Missing file_id for part {i+1}. Skipping.")
@@ -119,26 +141,27 @@ def download_file_main(file_to_download, db):
                 
                 part_path = os.path.join(temp_download_dir, f"part_{i}")
                 future = executor.submit(download_part_worker, BOT_TOKEN, file_id, part_path)
-                future_to_part_path[future] = part_path
+                future_to_part_index[future] = i
 
-            with tqdm(total=total_parts, unit="part", desc=f"Downloading {file_to_download}") as pbar:
-                for future in as_completed(future_to_part_path):
+            with tqdm(total=total_parts, unit="part", desc=f"Downloading {file_to_download}", initial=hole_count) as pbar:
+                for future in as_completed(future_to_part_index):
                     result_path = future.result()
                     if result_path:
                         downloaded_parts_paths.append(result_path)
+                        parts_by_index[future_to_part_index[future]] = result_path
                     pbar.update(1)
 
-        if len(downloaded_parts_paths) != total_parts:
-            print(f"\nError: Download failed. Expected {total_parts} parts, but only got {len(downloaded_parts_paths)}.")
+        if len(downloaded_parts_paths) + hole_count != total_parts:
+            print(f"\nError: Download failed. Expected {total_parts - hole_count} parts, but only got {len(downloaded_parts_paths)}.")
             return
 
         print("\nAll parts downloaded successfully. Now joining them...")
         
         final_output_path = os.path.join(DOWNLOAD_FOLDER, file_to_download)
-        downloaded_parts_paths.sort(key=lambda x: int(os.path.basename(x).split('_')[1]))
-        join_files_here(downloaded_parts_paths, final_output_path)
+        join_files_here(parts_by_index, final_output_path, chunk_size, file_info["file_size_bytes"])
 
         print(f"\n✅ Success! File '{file_to_download}' has been reassembled in the '{DOWNLOAD_FOLDER}' directory.")
+        return final_output_path
 
     except Exception as e:
         print(f"\n---FATAL DOWNLOAD ERROR---")
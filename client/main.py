@@ -5,9 +5,8 @@ import os
 # This allows the script to find our other project modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# We will import the main functions from our two uploader scripts
-from client.uploader_user import main as user_uploader_main
-from client.uploader_bot import main as bot_uploader_main
+# The uploaders pull in Telethon/telebot, which are slow to import, so each one
+# is only imported once its menu option is chosen.
 
 def display_menu():
     """Displays the main menu to the user."""
@@ -18,7 +17,7 @@ def display_menu():
     print("  1. Bot Method (20 MB chunks)")
     print("     - Pros: Simpler, no separate login needed.")
     print("     - Cons: Many small parts, may be less reliable for huge files.")
-    print("\n  2. User Method (2 GB chunks)")
+    print("\n  2. User Method (up to 2 GB chunks)")
     print("     - Pros: More reliable for huge files, faster for good connections.")
     print("     - Cons: Requires one-time login with your phone number.")
     print("\n  Q. Quit")
@@ -32,12 +31,14 @@ def main():
 
         if choice == '1':
             print("\n--- Starting Bot Uploader ---\n")
+            from client.uploader_bot import main as bot_uploader_main
             bot_uploader_main()
             break
         elif choice == '2':
             print("\n--- Starting User Uploader ---\n")
             # The user uploader is an async function, so we need to run it in an event loop
             import asyncio
+            from client.uploader_user import main as user_uploader_main
             asyncio.run(user_uploader_main())
             break
         elif choice == 'q':
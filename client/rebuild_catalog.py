@@ -0,0 +1,238 @@
+# client/rebuild_catalog.py
+import os
+import re
+import sys
+import json
+import shutil
+import asyncio
+import argparse
+from telethon import TelegramClient
+from tqdm import tqdm
+
+# This allows the script to find our other project modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from client.config import API_ID, API_HASH, CHANNEL_ID
+except ImportError:
+    print("---FATAL ERROR---")
+    print("Could not import client/config.py. Please create it and add your API credentials.")
+    sys.exit(1)
+
+from client import config as user_config
+from utils.telegram_api import known_channels, parse_layout_marker
+
+# --- CONFIGURATION & CONSTANTS ---
+DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
+SESSION_NAME = "telegram_user_session"
+# Every channel parts may have been stored in (CHANNEL_ID and CHANNEL_IDS)
+STORAGE_CHANNELS = known_channels(user_config)
+# --- SPEED OPTIMIZATION ---
+# Number of message-ID ranges scanned at the same time in each channel. Each range
+# is read in pages of 100 messages, the most Telegram returns per history request.
+SCAN_WORKERS = 8
+# Captions written by both uploaders: "<original name>.part<N>"
+PART_CAPTION_RE = re.compile(r"^(?P<name>.+)\.part(?P<num>\d+)$")
+
+# --- DATABASE FUNCTIONS ---
+def load_db():
+    if not os.path.exists(DB_PATH):
+        return {}
+    with open(DB_PATH, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print("Warning: Existing database is corrupted. It will be replaced (a backup is kept).")
+            return {}
+
+def save_db(data):
+    with open(DB_PATH, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+
+# --- CHANNEL SCAN ---
+async def scan_range(client, channel_id, low_id, high_id, found, layouts, pbar):
+    """
+    Reads every message with low_id <= id <= high_id in one channel and collects
+    the file parts and the layout markers posted after each upload.
+    """
+    last_id = high_id + 1
+    # min_id/max_id are exclusive. wait_time=0 turns off Telethon's polite delay
+    # between pages; real flood waits are still honoured by the client.
+    async for message in client.iter_messages(channel_id, min_id=low_id - 1, max_id=high_id + 1, limit=None, wait_time=0):
+        pbar.update(last_id - message.id)
+        last_id = message.id
+        if not message.message:
+            continue
+        if not message.document:
+            layout = parse_layout_marker(message.message)
+            if layout:
+                layouts.append(layout + (message.date.timestamp(),))
+            continue
+        match = PART_CAPTION_RE.match(message.message.strip())
+        if match:
+            found.append((match.group("name"), int(match.group("num")), channel_id, message.id,
+                          message.file.size, message.date.timestamp()))
+    pbar.update(last_id - low_id)
+
+async def scan_channel(client, channel_id, found, layouts, workers=SCAN_WORKERS):
+    """Scans one channel's whole history, split into `workers` ID ranges scanned concurrently."""
+    latest = await client.get_messages(channel_id, limit=1)
+    if not latest:
+        return
+    max_id = latest[0].id
+
+    range_size = -(-max_id // workers)
+    with tqdm(total=max_id, unit="msg", desc=f"Scanning {channel_id}") as pbar:
+        await asyncio.gather(*(
+            scan_range(client, channel_id, low_id, min(low_id + range_size - 1, max_id), found, layouts, pbar)
+            for low_id in range(1, max_id + 1, range_size)
+        ))
+
+async def scan_all_channels(client, workers=SCAN_WORKERS):
+    """Scans every storage channel at the same time and returns (parts, layout_markers)."""
+    found = []
+    layouts = []
+    await asyncio.gather(*(scan_channel(client, channel_id, found, layouts, workers) for channel_id in STORAGE_CHANNELS))
+    return found, layouts
+
+# --- REGROUPING ---
+def expected_size(part_number, file_size, chunk_size):
+    return min(chunk_size, file_size - (part_number - 1) * chunk_size)
+
+def group_parts(found, layouts=()):
+    """
+    Turns scanned parts (name, part_number, channel_id, message_id, size, date) and
+    layout markers (name, total_parts, holes, file_size, chunk_size, date) into
+    catalog entries. Returns (entries, problems); problems maps a file name to a
+    short explanation. Files whose layout can't be worked out are left out.
+    """
+    # The newest marker describes the last completed upload. Its parts were posted
+    # after the marker of the upload before it (if any) and before the marker itself.
+    markers = {}
+    for layout in sorted(layouts, key=lambda layout: layout[5]):
+        name = layout[0]
+        older_than = markers[name][0][5] if name in markers else 0
+        markers[name] = (layout, older_than)
+
+    # If a part was uploaded more than once, the newest message wins. Message IDs
+    # are only ordered within one channel, so the post date decides first.
+    latest = {}
+    unfinished = {}
+    for name, part_number, channel_id, message_id, size, date in found:
+        if name in markers:
+            if date < markers[name][1]:
+                continue # From an older upload of the same name
+            if date > markers[name][0][5]:
+                # From a later upload that never finished
+                unfinished[name] = unfinished.get(name, 0) + 1
+                continue
+        key = (name, part_number)
+        if key not in latest or (date, message_id) > latest[key][3]:
+            latest[key] = (message_id, size, channel_id, (date, message_id))
+
+    # A file made only of holes has a marker but no parts.
+    by_name = {name: {} for name in markers}
+    for (name, part_number), part in latest.items():
+        by_name.setdefault(name, {})[part_number] = part
+
+    entries = {}
+    problems = {}
+    for name, parts in by_name.items():
+        if name in markers:
+            _, total_parts, holes, file_size, chunk_size, _ = markers[name][0]
+            parts = {n: part for n, part in parts.items() if n <= total_parts}
+            mismatched = [n for n in sorted(parts) if parts[n][1] != expected_size(n, file_size, chunk_size)]
+            if mismatched:
+                problems[name] = f"parts {mismatched} don't match the layout posted after the upload; skipped"
+                continue
+            missing = [n for n in range(1, total_parts + 1) if n not in parts]
+            if len(missing) != holes:
+                problems[name] = (f"{len(missing)} parts not found, but the upload left {holes} zero-filled holes;"
+                                  f" skipped")
+                continue
+            if name in unfinished:
+                problems[name] = (f"ignored {unfinished[name]} parts of a later upload that never finished;"
+                                  f" rebuilt from the last completed upload")
+        else:
+            # No marker (uploaded before markers were posted): the layout is inferred.
+            # Only the last part may be shorter, so the part size has to come from another part.
+            total_parts = max(parts)
+            last_size = parts[total_parts][1]
+            sizes = [parts[n][1] for n in sorted(parts) if n != total_parts]
+            if not sizes and total_parts != 1:
+                problems[name] = f"only part {total_parts} was found, so the part size is unknown; skipped"
+                continue
+            chunk_size = sizes[0] if sizes else last_size
+            if any(size != chunk_size for size in sizes) or last_size > chunk_size:
+                problems[name] = "parts have mixed sizes (uploaded more than once with different layouts); skipped"
+                continue
+            file_size = (total_parts - 1) * chunk_size + last_size
+
+            notes = []
+            missing = [n for n in range(1, total_parts + 1) if n not in parts]
+            if missing:
+                # Holes (all-zero parts) are never uploaded, so a gap may be one.
+                notes.append(f"parts {missing} not found; recorded as zero-filled holes")
+            if last_size == chunk_size:
+                # A short last part proves where the file ends; a full-sized one doesn't.
+                notes.append("zero-filled parts at the end can't be detected, so the file may be cut short")
+            if notes:
+                problems[name] = "; ".join(notes) + ". Verify the file"
+
+        entries[name] = {
+            "message_ids": [parts[n][0] if n in parts else None for n in range(1, total_parts + 1)],
+            "channels": [parts[n][2] if n in parts else None for n in range(1, total_parts + 1)],
+            "total_parts": total_parts,
+            "file_size_bytes": file_size,
+            "chunk_size": chunk_size,
+            "rebuilt": True
+        }
+    return entries, problems
+
+async def main():
+    parser = argparse.ArgumentParser(description="Rebuild bot/file_db.json by scanning the storage channel.")
+    parser.add_argument('--workers', type=int, default=SCAN_WORKERS, help="Number of ID ranges to scan concurrently per channel")
+    parser.add_argument('--replace', action='store_true', help="Replace existing entries instead of keeping them")
+    args = parser.parse_args()
+
+    client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+
+    print("Connecting to Telegram as user...")
+    await client.start()
+    print("Successfully connected.")
+
+    try:
+        found, layouts = await scan_all_channels(client, max(1, args.workers))
+    finally:
+        await client.disconnect()
+        print("Client disconnected.")
+
+    entries, problems = group_parts(found, layouts)
+    print(f"\nFound {len(found)} parts belonging to {len({part[0] for part in found})} files.")
+
+    db = load_db()
+    if os.path.exists(DB_PATH):
+        shutil.copy2(DB_PATH, DB_PATH + ".bak")
+        print(f"Previous database backed up to '{DB_PATH}.bak'.")
+
+    added = 0
+    for name, entry in entries.items():
+        # Existing entries can hold more than the channel does (e.g. bot file_ids),
+        # so they are only replaced when asked to.
+        if name in db and not args.replace:
+            continue
+        db[name] = entry
+        added += 1
+    save_db(db)
+
+    for name, problem in sorted(problems.items()):
+        print(f"Warning: '{name}': {problem}")
+    marked = {layout[0] for layout in layouts}
+    unmarked = [name for name in entries if name not in marked]
+    if unmarked:
+        print(f"\nNote: {len(unmarked)} files were uploaded before layout markers were posted. Their size is"
+              f" inferred from the parts found, and zero-filled parts at the end of a file can't be detected.")
+    print(f"\n✅ Catalog rebuilt: {added} entries written, {len(db)} files in total.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,295 @@
+# client/scrub.py
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from telethon import TelegramClient
+from tqdm import tqdm
+
+# This allows the script to find our other project modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from client.config import API_ID, API_HASH
+except ImportError:
+    print("---FATAL ERROR---")
+    print("Could not import client/config.py. Please create it and add your API credentials.")
+    sys.exit(1)
+
+from client import downloader, downloader_bot
+from utils.telegram_api import part_channel
+
+# --- CONFIGURATION & CONSTANTS ---
+DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
+SESSION_NAME = "telegram_user_session"
+SCRUB_FOLDER = os.path.join("downloads", "_scrub")
+# --- BUDGET DEFAULTS ---
+# Most data fetched per run, and the wall-clock time after which no new part is started.
+DEFAULT_MAX_BYTES = int(4 * 1024 * 1024 * 1024)
+DEFAULT_MAX_SECONDS = 30 * 60
+
+# --- DATABASE FUNCTIONS ---
+def load_db():
+    if not os.path.exists(DB_PATH):
+        return {}
+    with open(DB_PATH, 'r', encoding='utf-8') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            print("Warning: Database file is corrupted or empty.")
+            return {}
+
+def save_db(data):
+    with open(DB_PATH, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+
+# --- PLANNING ---
+def stored_parts(info):
+    """Yields (part_index, channel_id, message_id, file_id) for every stored (non-hole) part of an entry."""
+    if "messages" in info:
+        for i, msg_info in enumerate(info["messages"]):
+            if not msg_info.get("hole"):
+                yield i, part_channel(info, i, downloader.CHANNEL_ID), msg_info.get("message_id"), msg_info.get("file_id")
+    else:
+        for i, msg_id in enumerate(info.get("message_ids", [])):
+            if msg_id is not None:
+                yield i, part_channel(info, i, downloader.CHANNEL_ID), msg_id, None
+
+def upload_hash(info, part_index):
+    """The SHA-256 recorded when the part was uploaded, or None for entries from before it was recorded."""
+    if "messages" in info:
+        return info["messages"][part_index].get("sha256")
+    part_hashes = info.get("part_hashes") or []
+    return part_hashes[part_index] if part_index < len(part_hashes) else None
+
+def expected_part_size(info, part_index):
+    if "messages" in info:
+        chunk_size = info.get("chunk_size", downloader_bot.DEFAULT_CHUNK_SIZE)
+    else:
+        chunk_size = info.get("chunk_size", downloader.DEFAULT_CHUNK_SIZE)
+    return min(chunk_size, info["file_size_bytes"] - part_index * chunk_size)
+
+def plan_scrub(db, max_bytes, sample=False):
+    """
+    Picks the parts to verify this run, staying within `max_bytes`.
+
+    Rotation (the default) starts with the files checked longest ago and continues
+    each file from the part where the previous run stopped. Sample mode picks
+    random parts from the whole catalog instead.
+    """
+    candidates = []
+    # Duplicates point at the same messages as their original, so they are skipped.
+    originals = {name: info for name, info in db.items() if "duplicate_of" not in info}
+
+    if sample:
+        for name, info in originals.items():
+            for part in stored_parts(info):
+                candidates.append((name,) + part)
+        random.shuffle(candidates)
+    else:
+        order = sorted(originals, key=lambda n: (originals[n].get("scrub", {}).get("last_pass", 0), n))
+        for name in order:
+            next_part = originals[name].get("scrub", {}).get("next_part", 0)
+            for part in stored_parts(originals[name]):
+                if part[0] >= next_part:
+                    candidates.append((name,) + part)
+
+    planned = []
+    planned_bytes = 0
+    for name, part_index, channel_id, message_id, file_id in candidates:
+        size = expected_part_size(db[name], part_index)
+        if planned and planned_bytes + size > max_bytes:
+            break
+        planned.append({"name": name, "part_index": part_index, "channel_id": channel_id,
+                        "message_id": message_id, "file_id": file_id, "expected_size": size})
+        planned_bytes += size
+    return planned
+
+# --- VERIFICATION ---
+def hash_part(part_path):
+    h = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        for block in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+async def fetch_part(part, user_client, bot_executor):
+    """Downloads one part through the regular download path of its upload method."""
+    part_path = os.path.join(SCRUB_FOLDER, f"{part['channel_id']}_{part['message_id']}")
+    if part["file_id"]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(bot_executor, downloader_bot.download_part_worker,
+                                          downloader_bot.BOT_TOKEN, part["file_id"], part_path)
+    pbar_chunk = tqdm(total=0, unit='B', unit_scale=True, desc=f"Msg {part['message_id']}", leave=False)
+    return await downloader.download_worker(user_client, part["channel_id"], part["message_id"], part_path, pbar_chunk)
+
+async def verify_part(part, db, user_client, bot_executor):
+    """Fetches a part and fills in part['status'] ('ok', 'missing', 'size', 'hash') and part['sha256']."""
+    try:
+        part_path = await fetch_part(part, user_client, bot_executor)
+    except Exception as e:
+        print(f"\nWarning: Could not fetch part {part['part_index'] + 1} of '{part['name']}'. Error: {e}")
+        part_path = None
+    if not part_path or not os.path.exists(part_path):
+        part["status"] = "missing"
+        return
+
+    try:
+        part["actual_size"] = os.path.getsize(part_path)
+        if part["actual_size"] != part["expected_size"]:
+            part["status"] = "size"
+            return
+        loop = asyncio.get_running_loop()
+        part["sha256"] = await loop.run_in_executor(None, hash_part, part_path)
+        # Older entries have no upload hash; they are checked against the first scrub's hash instead.
+        info = db[part["name"]]
+        recorded = upload_hash(info, part["part_index"]) or info.get("scrub", {}).get("part_hashes", {}).get(str(part["part_index"]))
+        part["status"] = "hash" if recorded and recorded != part["sha256"] else "ok"
+    finally:
+        os.remove(part_path)
+
+async def run_scrub(planned, db, max_seconds, max_rate):
+    """Verifies the planned parts concurrently, starting no new part once the time budget is spent."""
+    user_client = None
+    if any(not part["file_id"] for part in planned):
+        user_client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
+        print("Connecting to Telegram as user...")
+        await user_client.start()
+        print("Successfully connected.")
+
+    os.makedirs(SCRUB_FOLDER, exist_ok=True)
+    bot_executor = ThreadPoolExecutor(max_workers=downloader_bot.CONCURRENT_DOWNLOADS)
+    # Same concurrency as a regular download with each method (per channel for the user method).
+    user_semaphores = {}
+    bot_semaphore = asyncio.Semaphore(downloader_bot.CONCURRENT_DOWNLOADS)
+    started = time.monotonic()
+    bytes_started = 0
+
+    try:
+        with tqdm(total=len(planned), unit="part", desc="Scrubbing") as pbar:
+            async def run_one(part):
+                nonlocal bytes_started
+                if max_rate:
+                    # Reserve this part's bytes, then wait until the average rate allows it.
+                    ahead = bytes_started / max_rate - (time.monotonic() - started)
+                    bytes_started += part["expected_size"]
+                    if ahead > 0:
+                        await asyncio.sleep(ahead)
+                if part["file_id"]:
+                    semaphore = bot_semaphore
+                else:
+                    semaphore = user_semaphores.setdefault(part["channel_id"], asyncio.Semaphore(downloader.CONCURRENT_DOWNLOADS))
+                async with semaphore:
+                    if time.monotonic() - started > max_seconds:
+                        return # Time budget spent; this part stays queued for the next run
+                    await verify_part(part, db, user_client, bot_executor)
+                pbar.update(1)
+
+            await asyncio.gather(*(run_one(part) for part in planned))
+    finally:
+        bot_executor.shutdown(wait=False)
+        if user_client is not None:
+            await user_client.disconnect()
+        shutil.rmtree(SCRUB_FOLDER, ignore_errors=True)
+
+# --- RESULTS ---
+def record_results(planned, sample=False):
+    """Merges this run's results into a freshly loaded catalog so concurrent uploads aren't lost."""
+    db = load_db()
+    now = int(time.time())
+
+    by_name = {}
+    for part in planned:
+        by_name.setdefault(part["name"], []).append(part)
+
+    for name, parts in by_name.items():
+        if name not in db:
+            continue # Removed while we were scrubbing
+        info = db[name]
+        state = info.setdefault("scrub", {})
+        part_hashes = state.setdefault("part_hashes", {})
+        bad_parts = set(state.get("bad_parts", []))
+
+        for part in parts:
+            status = part.get("status")
+            if status is None:
+                continue
+            key = str(part["part_index"])
+            if status == "ok":
+                if not upload_hash(info, part["part_index"]):
+                    part_hashes.setdefault(key, part["sha256"])
+                bad_parts.discard(part["part_index"])
+            else:
+                bad_parts.add(part["part_index"])
+        state["bad_parts"] = sorted(bad_parts)
+        state["last_checked"] = now
+
+        if not sample:
+            # Continue from the first part that was planned but not reached.
+            unchecked = [p["part_index"] for p in parts if p.get("status") is None]
+            if unchecked:
+                state["next_part"] = min(unchecked)
+            else:
+                state["next_part"] = max(p["part_index"] for p in parts) + 1
+            # Trailing holes are never checked, so the pass ends after the last stored part.
+            last_stored = max((part[0] for part in stored_parts(info)), default=-1)
+            if state["next_part"] > last_stored:
+                state["next_part"] = 0
+                state["last_pass"] = now
+
+    save_db(db)
+    return db
+
+def print_report(planned, db):
+    reasons = {
+        "missing": "message or document not found",
+        "size": "size mismatch",
+        "hash": "content differs from what was uploaded (or last verified)",
+    }
+    checked = [part for part in planned if part.get("status")]
+    bad = [part for part in checked if part["status"] != "ok"]
+    for part in bad:
+        detail = reasons[part["status"]]
+        if part["status"] == "size":
+            detail += f" (expected {part['expected_size']}, got {part['actual_size']})"
+        print(f"❌ '{part['name']}' part {part['part_index'] + 1}: {detail}")
+
+    print(f"\nChecked {len(checked)}/{len(planned)} planned parts, {len(bad)} bad.")
+    known_bad = {name: info["scrub"]["bad_parts"] for name, info in db.items() if info.get("scrub", {}).get("bad_parts")}
+    if known_bad:
+        print("Files with parts that need re-uploading:")
+        for name, parts in sorted(known_bad.items()):
+            print(f"  {name}: parts {[i + 1 for i in parts]}")
+    return len(bad)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Verify that stored parts can still be downloaded intact.")
+    parser.add_argument('--max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024**3, help="Most data to fetch this run")
+    parser.add_argument('--max-minutes', type=float, default=DEFAULT_MAX_SECONDS / 60, help="Time after which no new part is started")
+    parser.add_argument('--max-rate-mb', type=float, default=0, help="Average download rate limit in MB/s (0 = unlimited)")
+    parser.add_argument('--sample', action='store_true', help="Check random parts instead of continuing the rotation")
+    args = parser.parse_args()
+
+    db = load_db()
+    if not db:
+        print("Database not found or is empty. Nothing to scrub.")
+        return 0
+
+    planned = plan_scrub(db, int(args.max_gb * 1024**3), sample=args.sample)
+    if not planned:
+        print("No stored parts to check.")
+        return 0
+    print(f"Checking {len(planned)} parts ({sum(p['expected_size'] for p in planned) / 1024**2:.2f} MB).")
+
+    await run_scrub(planned, db, args.max_minutes * 60, args.max_rate_mb * 1024 * 1024)
+    db = record_results(planned, sample=args.sample)
+    return 1 if print_report(planned, db) else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
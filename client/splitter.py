@@ -1,38 +1,112 @@
 # splitter.py
 import os
+import sys
+import json
 
-def parse_size(size_str):
-    # This function now ignores the input and always returns 95% of 50 MB.
-    # It calculates a fixed value to stay safely under Telegram's limit.
-    fixed_size_in_bytes = int((50 * 1024 * 1024) * 0.95)
-    return fixed_size_in_bytes
+# This allows the script to find our other project modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-def split_file(file_path, chunk_size):
+from utils.file_utils import parse_size, copy_range, copy_file_into
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+def plan_parts(file_size, chunk_size):
+    """Returns (part_number, offset, length) for every part of a file."""
+    chunk_size = int(chunk_size)
+    return [
+        (i + 1, offset, min(chunk_size, file_size - offset))
+        for i, offset in enumerate(range(0, file_size, chunk_size))
+    ]
+
+def split_file(file_path, chunk_size, reflink=False):
+    """
+    Splits a file into `<name>.partN` files next to it.
+
+    Data is moved inside the kernel (reflink, copy_file_range or sendfile), so
+    memory use stays flat no matter how large the parts are.
+    """
     file_size = os.path.getsize(file_path)
     base_name = os.path.basename(file_path)
     file_dir = os.path.dirname(file_path)
-    part_num = 1
     parts = []
 
-    with open(file_path, 'rb') as f:
-        while True:
-            chunk = f.read(int(chunk_size))
-            if not chunk:
-                break
+    src_fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        for part_num, offset, length in plan_parts(file_size, chunk_size):
             part_name = f"{base_name}.part{part_num}"
             part_path = os.path.join(file_dir, part_name)
-            with open(part_path, 'wb') as pf:
-                pf.write(chunk)
+            dst_fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                copy_range(src_fd, dst_fd, offset, length, 0, reflink=reflink)
+            finally:
+                os.close(dst_fd)
             parts.append(part_path)
-            part_num += 1
+    finally:
+        os.close(src_fd)
 
     return parts
 
-def join_files(parts_list, output_file):
-    with open(output_file, 'wb') as outfile:
+def split_virtual(file_path, chunk_size, manifest_path=None):
+    """
+    Writes only an offsets manifest describing the parts instead of copying any data.
+    Returns the path of the manifest.
+    """
+    file_size = os.path.getsize(file_path)
+    base_name = os.path.basename(file_path)
+    manifest_path = manifest_path or file_path + MANIFEST_SUFFIX
+
+    manifest = {
+        "file": base_name,
+        "file_size_bytes": file_size,
+        "chunk_size": int(chunk_size),
+        "parts": [
+            {"name": f"{base_name}.part{part_num}", "offset": offset, "length": length}
+            for part_num, offset, length in plan_parts(file_size, chunk_size)
+        ],
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest_path
+
+def load_manifest(manifest_path):
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def join_manifest(manifest_path, output_file, reflink=False):
+    """
+    Joins the part files listed in a manifest (looked up next to it), writing each
+    one at its recorded offset. Every part must be present with its recorded length.
+    """
+    manifest = load_manifest(manifest_path)
+    base_path = os.path.dirname(manifest_path) or '.'
+
+    part_paths = []
+    for part in manifest["parts"]:
+        part_path = os.path.join(base_path, part["name"])
+        if not os.path.exists(part_path):
+            raise FileNotFoundError(f"Part '{part['name']}' listed in the manifest was not found in '{base_path}'")
+        if os.path.getsize(part_path) != part["length"]:
+            raise ValueError(f"Part '{part['name']}' is {os.path.getsize(part_path)} bytes, the manifest expects {part['length']}")
+        part_paths.append(part_path)
+
+    dst_fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        for part, part_path in zip(manifest["parts"], part_paths):
+            copy_file_into(part_path, dst_fd, part["offset"], reflink=reflink)
+        os.ftruncate(dst_fd, manifest["file_size_bytes"])
+    finally:
+        os.close(dst_fd)
+    return output_file
+
+def join_files(parts_list, output_file, reflink=False):
+    """Concatenates the parts into `output_file` without reading them into memory."""
+    dst_fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        offset = 0
         for part in parts_list:
-            with open(part, 'rb') as pf:
-                outfile.write(pf.read())
+            offset += copy_file_into(part, dst_fd, offset, reflink=reflink)
+    finally:
+        os.close(dst_fd)
     return output_file
 
 if __name__ == '__main__':
@@ -40,8 +114,10 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description="Split or join files.")
     parser.add_argument('--split', help="Path to file to split")
-    parser.add_argument('--size', help="Size of each part (e.g., 2gb, 500mb)", default="4.9gb")
-    parser.add_argument('--join', nargs='+', help="Parts to join")
+    parser.add_argument('--size', help="Size of each part (e.g., 2gb, 500mb)", default="2000mb")
+    parser.add_argument('--virtual', action='store_true', help="Only write an offsets manifest, no part files")
+    parser.add_argument('--reflink', action='store_true', help="Share extents instead of copying where the filesystem allows")
+    parser.add_argument('--join', nargs='+', help="Parts to join, or a single <file>.manifest.json")
     parser.add_argument('--output', help="Output filename for joined file")
 
     args = parser.parse_args()
@@ -49,16 +125,28 @@ if __name__ == '__main__':
     if args.split:
         try:
             chunk_size = parse_size(args.size)
-            print(f"Splitting into chunks of ~{args.size} (using {chunk_size} bytes)...")
-            result = split_file(args.split, chunk_size)
-            print("Split into:", result)
+            if args.virtual:
+                print(f"Writing virtual split of ~{args.size} (using {chunk_size} bytes)...")
+                result = split_virtual(args.split, chunk_size)
+                print("Manifest written to:", result)
+            else:
+                print(f"Splitting into chunks of ~{args.size} (using {chunk_size} bytes)...")
+                result = split_file(args.split, chunk_size, reflink=args.reflink)
+                print("Split into:", result)
         except Exception as e:
             print("Error:", e)
     elif args.join:
         if not args.output:
             print("You must provide --output for joining.")
         else:
-            if len(args.join) == 1 and os.path.isfile(args.join[0]):
+            if len(args.join) == 1 and args.join[0].endswith(MANIFEST_SUFFIX):
+                print("Joining the parts listed in the manifest...")
+                try:
+                    output = join_manifest(args.join[0], args.output, reflink=args.reflink)
+                    print("Joined into:", output)
+                except (OSError, ValueError, KeyError) as e:
+                    print("Error:", e)
+            elif len(args.join) == 1 and os.path.isfile(args.join[0]):
                 # Auto-detect all parts
                 first_part = args.join[0]
                 base_path = os.path.dirname(first_part) or '.'
@@ -69,11 +157,11 @@ if __name__ == '__main__':
                 all_parts_full = [os.path.join(base_path, f) for f in all_parts]
 
                 print(f"Auto-joining {len(all_parts_full)} parts...")
-                output = join_files(all_parts_full, args.output)
+                output = join_files(all_parts_full, args.output, reflink=args.reflink)
                 print("Joined into:", output)
             else:
                 print("Joining manually listed files...")
-                output = join_files(args.join, args.output)
+                output = join_files(args.join, args.output, reflink=args.reflink)
                 print("Joined into:", output)
     else:
-        print("Use --split <file> --size <e.g. 2gb> or --join <part1 part2 ...> --output <file>")
+        print("Use --split <file> --size <e.g. 2gb> [--virtual] or --join <part1 part2 ... | file.manifest.json> --output <file>")
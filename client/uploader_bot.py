@@ -4,7 +4,10 @@ import sys
 import time
 import json
 import math
+import hashlib
+import threading
 import telebot
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 # This allows the script to find our other project modules
@@ -18,10 +21,19 @@ except ImportError as e:
     print(f"Details: {e}")
     sys.exit(1)
 
+from bot import config as bot_config
+from utils.file_utils import range_has_data, is_zero_block, read_range, sample_fingerprint, content_hash, find_duplicate, matches_entry
+from utils.telegram_api import storage_channels, place_part, layout_marker
+
 # --- CONFIGURATION & CONSTANTS ---
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
 CHUNK_SIZE = int(19 * 1024 * 1024)
 UPLOAD_RETRIES = 10 # Increased retries for more robustness
+# Parts are spread over CHANNEL_IDS (or just CHANNEL_ID) in bot/config.py
+STORAGE_CHANNELS = storage_channels(bot_config)
+# Minimum gap between two parts sent to the same channel, to stay clear of flood limits.
+# With several channels the parts rotate between them, so this rarely has to wait.
+PER_CHANNEL_DELAY = 1
 
 # --- DATABASE FUNCTIONS ---
 def load_db():
@@ -37,9 +49,41 @@ def save_db(data):
     with open(DB_PATH, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4)
 
+# --- PART SENDER ---
+def send_part(bot_instance, channel_id, chunk_data, part_name):
+    """Sends one part, retrying on errors and honouring rate limits. Raises once all retries fail."""
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            return bot_instance.send_document(
+                chat_id=channel_id,
+                document=chunk_data,
+                visible_file_name=part_name,
+                caption=part_name,
+                timeout=90 # Increased timeout
+            )
+        except telebot.apihelper.ApiTelegramException as e:
+            if e.error_code == 429:
+                error_json = json.loads(e.result.text)
+                retry_after = error_json['parameters']['retry_after']
+                print(f"\nRate limit hit. Waiting for {retry_after} seconds as requested by Telegram...")
+                time.sleep(retry_after)
+            else:
+                print(f"\nTelegram API Error: {e}")
+                time.sleep(5)
+            last_error = e
+        except Exception as e:
+            print(f"\nFailed to upload {part_name} on attempt {attempt + 1}. Error: {e}")
+            if attempt < UPLOAD_RETRIES - 1:
+                time.sleep(10) # General network error, wait longer
+            last_error = e
+    raise last_error # All retries failed, stop the upload
+
 # --- CORE UPLOAD LOGIC ---
-def upload_file_bot(file_path, bot_instance):
-    """Splits a file into 19MB chunks and uploads them via the Bot API."""
+def upload_file_bot(file_path, bot_instance, interactive=True):
+    """
+    Splits a file into 19MB chunks and uploads them via the Bot API.
+    With interactive=False (e.g. from the daemon) complete uploads are never overwritten.
+    """
     if not os.path.exists(file_path):
         print(f"Error: File not found at '{file_path}'")
         return
@@ -47,10 +91,38 @@ def upload_file_bot(file_path, bot_instance):
     original_filename = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
     total_parts = math.ceil(file_size / CHUNK_SIZE)
+    sample_hash = sample_fingerprint(file_path)
 
     db = load_db()
     uploaded_message_info = []
     start_part_index = 0
+    known_content_hash = None
+
+    # --- Same name but different content: never resume on top of another file ---
+    existing_data = db.get(original_filename)
+    if existing_data:
+        print("Checking the file against its existing record...")
+        same_content, known_content_hash = matches_entry(existing_data, file_path, sample_hash)
+    if existing_data and not same_content:
+        print(f"A different file named '{original_filename}' is already in the database.")
+        if interactive:
+            replace_choice = input("Do you want to replace its record with this file? (y/n): ").lower().strip()
+        else:
+            replace_choice = 'n'
+        if replace_choice != 'y':
+            print("Upload cancelled.")
+            return
+        db.pop(original_filename, None)
+        save_db(db)
+
+    # --- Identical content already stored (under any name): record it without uploading ---
+    if original_filename not in db:
+        duplicate_name, known_content_hash = find_duplicate(db, file_path, file_size, sample_hash, full_hash=known_content_hash)
+        if duplicate_name:
+            db[original_filename] = dict(db[duplicate_name], duplicate_of=duplicate_name)
+            save_db(db)
+            print(f"\n✅ '{original_filename}' has the same content as '{duplicate_name}'. Recorded it without uploading.")
+            return True
 
     # --- NEW: Automatic Resume Logic ---
     if original_filename in db:
@@ -66,6 +138,9 @@ def upload_file_bot(file_path, bot_instance):
         # If the upload is complete, ask to overwrite
         elif num_parts_on_record >= total_parts:
             print(f"A complete record for '{original_filename}' already exists in the database.")
+            if not interactive:
+                # Only a full-hash match proves the stored copy is this file
+                return True if existing_data.get("content_hash") else None
             overwrite_choice = input("Do you want to overwrite it and re-upload from scratch? (y/n): ").lower().strip()
             if overwrite_choice != 'y':
                 print("Upload cancelled.")
@@ -79,65 +154,108 @@ def upload_file_bot(file_path, bot_instance):
                 save_db(db)
 
 
+    # --- The full hash is saved with every part, so a resume can confirm the file is unchanged ---
+    if known_content_hash is None:
+        print("Hashing file contents...")
+        known_content_hash = content_hash(file_path)
+
     print(f"'{original_filename}' ({file_size / 1024**2:.2f} MB) will be uploaded in {total_parts} parts.")
 
+    # --- One sender thread per channel, so throughput grows with the number of channels ---
+    parts_by_channel = {}
+    for i in range(start_part_index, total_parts):
+        parts_by_channel.setdefault(place_part(original_filename, i, STORAGE_CHANNELS), []).append(i)
+    if len(parts_by_channel) > 1:
+        print(f"Sending to {len(parts_by_channel)} channels in parallel.")
+
+    finished = {} # part index -> record, for parts not yet saved
+    db_lock = threading.Lock()
+    failed = threading.Event()
+
+    def record_part(part_index, record, pbar):
+        """Saves the contiguous run of finished parts, so a resume always continues after the last saved one."""
+        with db_lock:
+            finished[part_index] = record
+            while len(uploaded_message_info) in finished:
+                uploaded_message_info.append(finished.pop(len(uploaded_message_info)))
+            db[original_filename] = {
+                "messages": uploaded_message_info,
+                "total_parts": total_parts,
+                "file_size_bytes": file_size,
+                "chunk_size": CHUNK_SIZE,
+                "sample_hash": sample_hash,
+                "content_hash": known_content_hash,
+                "upload_method": "bot"
+            }
+            save_db(db)
+            pbar.update(1)
+
+    def channel_sender(fd, channel_id, part_indexes, pbar):
+        last_send_time = 0
+        for i in part_indexes:
+            if failed.is_set():
+                return
+            part_offset = i * CHUNK_SIZE
+            part_length = min(CHUNK_SIZE, file_size - part_offset)
+
+            # --- Sparse/zero regions are recorded as holes, not uploaded ---
+            chunk_data = read_range(fd, part_offset, part_length) if range_has_data(fd, part_offset, part_length) else None
+            if chunk_data is not None and len(chunk_data) != part_length:
+                raise IOError(f"Could only read {len(chunk_data)} of {part_length} bytes of part {i + 1} (the file changed?)")
+            if chunk_data is None or is_zero_block(chunk_data):
+                record_part(i, {'hole': True, 'size': part_length}, pbar)
+                continue
+
+            # --- Proactive per-channel delay to prevent rate limiting ---
+            wait = last_send_time + PER_CHANNEL_DELAY - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            message = send_part(bot_instance, channel_id, chunk_data, f"{original_filename}.part{i + 1}")
+            last_send_time = time.monotonic()
+            record_part(i, {
+                'message_id': message.id,
+                'file_id': message.document.file_id,
+                'channel_id': channel_id,
+                # SHA-256 of the part as sent, checked by client/scrub.py
+                'sha256': hashlib.sha256(chunk_data).hexdigest()
+            }, pbar)
+
     try:
         with open(file_path, 'rb') as f:
-            f.seek(start_part_index * CHUNK_SIZE)
             with tqdm(total=total_parts, unit="part", desc="Overall Progress", initial=start_part_index) as pbar:
-                for i in range(start_part_index, total_parts):
-                    part_name = f"{original_filename}.part{i + 1}"
-                    chunk_data = f.read(CHUNK_SIZE)
-                    if not chunk_data: break
-
-                    for attempt in range(UPLOAD_RETRIES):
+                with ThreadPoolExecutor(max_workers=max(1, len(parts_by_channel))) as executor:
+                    futures = [
+                        executor.submit(channel_sender, f.fileno(), channel_id, part_indexes, pbar)
+                        for channel_id, part_indexes in parts_by_channel.items()
+                    ]
+                    for future in as_completed(futures):
                         try:
-                            message = bot_instance.send_document(
-                                chat_id=CHANNEL_ID,
-                                document=chunk_data,
-                                visible_file_name=part_name,
-                                caption=part_name,
-                                timeout=90 # Increased timeout
-                            )
-                            uploaded_message_info.append({
-                                'message_id': message.id,
-                                'file_id': message.document.file_id
-                            })
-                            db[original_filename] = {
-                                "messages": uploaded_message_info,
-                                "total_parts": total_parts,
-                                "file_size_bytes": file_size,
-                                "upload_method": "bot"
-                            }
-                            save_db(db)
-                            break # Success, exit retry loop
-                        
-                        except telebot.apihelper.ApiTelegramException as e:
-                            if e.error_code == 429:
-                                error_json = json.loads(e.result.text)
-                                retry_after = error_json['parameters']['retry_after']
-                                print(f"\nRate limit hit. Waiting for {retry_after} seconds as requested by Telegram...")
-                                time.sleep(retry_after)
-                                continue 
-                            else:
-                                print(f"\nTelegram API Error: {e}")
-                                time.sleep(5)
-                        except Exception as e:
-                            print(f"\nFailed to upload {part_name} on attempt {attempt + 1}. Error: {e}")
-                            if attempt < UPLOAD_RETRIES - 1:
-                                time.sleep(10) # General network error, wait longer
-                            else:
-                                raise e # All retries failed, stop the upload
-                    
-                    pbar.update(1)
-                    # --- NEW: Proactive delay to prevent rate limiting ---
-                    time.sleep(1)
+                            future.result()
+                        except Exception:
+                            failed.set() # Stop the other senders after their current part
+                            raise
 
     except Exception as e:
         print(f"\nUpload process failed. Last progress was saved. Error: {e}")
         return
 
+    if len(uploaded_message_info) != total_parts:
+        print(f"\nError: Only {len(uploaded_message_info)}/{total_parts} parts were recorded (the file may have changed while uploading).")
+        return
+
+    # --- Record the layout in the channel so a catalog rebuild can recreate the holes ---
+    if original_filename in db:
+        holes = sum(1 for msg_info in uploaded_message_info if msg_info.get('hole'))
+        try:
+            bot_instance.send_message(
+                place_part(original_filename, 0, STORAGE_CHANNELS),
+                layout_marker(original_filename, total_parts, holes, file_size, CHUNK_SIZE)
+            )
+        except Exception as e:
+            print(f"\nWarning: Could not post the layout marker. Error: {e}")
+
     print(f"\n✅ Successfully uploaded all parts of '{original_filename}'.")
+    return True
 
 def main():
     """Main function for the bot uploader."""
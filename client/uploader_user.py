@@ -5,6 +5,7 @@ import time
 import json
 import math
 import asyncio
+import hashlib
 from telethon import TelegramClient
 from tqdm import tqdm
 
@@ -19,13 +20,34 @@ except ImportError:
     print("Please create it and add your API_ID, API_HASH, and CHANNEL_ID.")
     sys.exit(1)
 
+from client import config as user_config
+from utils.file_utils import range_has_data, is_zero_block, read_range, sample_fingerprint, content_hash, find_duplicate, matches_entry
+from utils.telegram_api import storage_channels, place_part, layout_marker
+
 # --- CONFIGURATION & CONSTANTS ---
 DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'bot', 'file_db.json'))
-CHUNK_SIZE = int(2000 * 1024 * 1024)
 SESSION_NAME = "telegram_user_session"
+# Parts are spread over CHANNEL_IDS (or just CHANNEL_ID) in client/config.py
+STORAGE_CHANNELS = storage_channels(user_config)
 # --- SPEED OPTIMIZATION ---
-# Number of chunks to upload at the same time. Increase if you have a very fast connection.
+# Number of chunks to upload at the same time to each storage channel. Increase if you have a very fast connection.
 CONCURRENT_UPLOADS = 4
+# Number of times a single failed part is retried before the upload stops.
+UPLOAD_RETRIES = 3
+
+# --- CHUNK SIZE PLANNING ---
+# Telegram's per-file limit for regular accounts. Parts never exceed this, and
+# catalog entries without a "chunk_size" were uploaded with exactly this size.
+MAX_CHUNK_SIZE = int(2000 * 1024 * 1024)
+# Below this, per-part overhead (one message per part) outweighs the gain.
+MIN_CHUNK_SIZE = int(64 * 1024 * 1024)
+# The most data a single failed part should force us to resend.
+TARGET_RETRY_COST = int(1024 * 1024 * 1024)
+# Each part being uploaded is held in memory. This caps their total across all
+# channels, so adding channels doesn't multiply memory use.
+MAX_BUFFERED_BYTES = int(4 * 1024 * 1024 * 1024)
+# Telethon sends files in 512 KB pieces, so parts are kept a multiple of that.
+CHUNK_ALIGNMENT = 512 * 1024
 
 # --- DATABASE FUNCTIONS ---
 def load_db():
@@ -42,15 +64,29 @@ def save_db(data):
     with open(DB_PATH, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4)
 
+def plan_chunk_size(file_size, concurrency=CONCURRENT_UPLOADS * len(STORAGE_CHANNELS), retry_cost=TARGET_RETRY_COST,
+                    buffer_budget=MAX_BUFFERED_BYTES):
+    """
+    Picks the part size for one file. Parts are small enough that every connection
+    gets work, all connections' parts fit in `buffer_budget` together, and a failed
+    part costs at most `retry_cost` to resend, but stay between MIN_CHUNK_SIZE and
+    Telegram's MAX_CHUNK_SIZE.
+    """
+    per_connection = math.ceil(file_size / max(1, concurrency))
+    buffered = buffer_budget // max(1, concurrency)
+    chunk_size = max(MIN_CHUNK_SIZE, min(per_connection, buffered, retry_cost, MAX_CHUNK_SIZE))
+    chunk_size = math.ceil(chunk_size / CHUNK_ALIGNMENT) * CHUNK_ALIGNMENT
+    return min(chunk_size, MAX_CHUNK_SIZE)
+
 # --- WORKER FOR CONCURRENT UPLOADS ---
-async def upload_worker(client, chunk_data, part_name, pbar_chunk):
+async def upload_worker(client, channel_id, chunk_data, part_name, pbar_chunk):
     """The worker function that uploads a single chunk and updates its progress bar."""
     def progress_callback(current, total):
         pbar_chunk.n = current
         pbar_chunk.refresh()
 
     message = await client.send_file(
-        CHANNEL_ID,
+        channel_id,
         chunk_data,
         caption=part_name,
         progress_callback=progress_callback
@@ -59,64 +95,138 @@ async def upload_worker(client, chunk_data, part_name, pbar_chunk):
     return message.id
 
 # --- CORE UPLOAD LOGIC ---
-async def upload_file_main(client, file_path):
-    """Reads a file chunk by chunk and uploads them concurrently."""
+async def upload_file_main(client, file_path, interactive=True):
+    """
+    Reads a file chunk by chunk and uploads them concurrently.
+    With interactive=False (e.g. from the daemon) incomplete uploads are resumed without asking.
+    """
     if not os.path.exists(file_path):
         print(f"Error: File not found at '{file_path}'")
         return
 
     original_filename = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
-    total_parts = math.ceil(file_size / CHUNK_SIZE)
+    chunk_size = plan_chunk_size(file_size)
+    loop = asyncio.get_running_loop()
+    # File reads and hashing run in threads so the event loop (e.g. the daemon's) stays responsive.
+    sample_hash = await loop.run_in_executor(None, sample_fingerprint, file_path)
 
     db = load_db()
     uploaded_part_ids = []
+    uploaded_part_channels = []
+    uploaded_part_hashes = []
     start_part_index = 0
+    known_content_hash = None
+
+    existing_data = db.get(original_filename)
+    # Same name but different content: never resume on top of another file.
+    if existing_data:
+        print("Checking the file against its existing record...")
+        same_content, known_content_hash = await loop.run_in_executor(None, matches_entry, existing_data, file_path, sample_hash)
+    if existing_data and not same_content:
+        print(f"A different file named '{original_filename}' is already in the database.")
+        if interactive:
+            replace_choice = input("Do you want to replace its record with this file? (y/n): ").lower().strip()
+        else:
+            replace_choice = 'n'
+        if replace_choice != 'y':
+            print("Upload cancelled.")
+            return
+        db.pop(original_filename, None)
+        existing_data = None
+
+    # Identical content already stored (under any name): record it without uploading.
+    if not existing_data:
+        duplicate_name, known_content_hash = await loop.run_in_executor(
+            None, find_duplicate, db, file_path, file_size, sample_hash, None, known_content_hash
+        )
+        if duplicate_name:
+            db[original_filename] = dict(db[duplicate_name], duplicate_of=duplicate_name)
+            save_db(db)
+            print(f"\n✅ '{original_filename}' has the same content as '{duplicate_name}'. Recorded it without uploading.")
+            return True
 
-    if original_filename in db:
+    if existing_data and "message_ids" in existing_data:
+        # A resumed upload has to keep the part layout it was started with.
+        chunk_size = existing_data.get("chunk_size", MAX_CHUNK_SIZE)
+    total_parts = math.ceil(file_size / chunk_size)
+
+    if existing_data:
         print(f"Found an existing record for '{original_filename}'.")
-        existing_data = db[original_filename]
         num_parts_on_record = len(existing_data.get("message_ids", []))
 
         if 0 < num_parts_on_record < total_parts:
-            resume_choice = input(f"Found {num_parts_on_record}/{total_parts} uploaded parts. Resume upload? (y/n): ").lower().strip()
+            if interactive:
+                resume_choice = input(f"Found {num_parts_on_record}/{total_parts} uploaded parts. Resume upload? (y/n): ").lower().strip()
+            else:
+                resume_choice = 'y'
             if resume_choice == 'y':
                 print(f"Resuming upload from part {num_parts_on_record + 1}...")
                 start_part_index = num_parts_on_record
                 uploaded_part_ids = existing_data["message_ids"]
+                # Entries from before sharding have every part in CHANNEL_ID
+                uploaded_part_channels = existing_data.get("channels", [CHANNEL_ID] * len(uploaded_part_ids))
+                uploaded_part_hashes = existing_data.get("part_hashes", [None] * len(uploaded_part_ids))
             else:
                 print("Starting upload from scratch as requested.")
                 db.pop(original_filename, None)
+                chunk_size = plan_chunk_size(file_size)
+                total_parts = math.ceil(file_size / chunk_size)
         elif num_parts_on_record == total_parts:
              print("This file has already been completely uploaded according to the database.")
-             return
+             if not existing_data.get("content_hash"):
+                 print("Its record has no content hash, so it can't be confirmed that the stored copy is this file.")
+                 return
+             return True
 
-    print(f"'{original_filename}' ({file_size / 1024**2:.2f} MB) will be uploaded in {total_parts} parts.")
-    print(f"Uploading with up to {CONCURRENT_UPLOADS} connections at once.")
+    print(f"'{original_filename}' ({file_size / 1024**2:.2f} MB) will be uploaded in {total_parts} parts of {chunk_size / 1024**2:.0f} MB.")
+    print(f"Uploading with up to {CONCURRENT_UPLOADS} connections per channel across {len(STORAGE_CHANNELS)} channel(s).")
 
     tasks = []
-    semaphore = asyncio.Semaphore(CONCURRENT_UPLOADS)
+    # Each channel gets its own slots, so throughput grows with the number of channels.
+    semaphores = {channel_id: asyncio.Semaphore(CONCURRENT_UPLOADS) for channel_id in STORAGE_CHANNELS}
+    # Parts held in memory at once, across all channels.
+    buffer_slots = asyncio.Semaphore(max(1, MAX_BUFFERED_BYTES // chunk_size))
 
     try:
         with open(file_path, 'rb') as f:
-            f.seek(start_part_index * CHUNK_SIZE)
             
             pbar_overall = tqdm(total=total_parts, unit="part", desc="Overall Progress", initial=start_part_index)
 
             async def task_creator(part_index):
-                async with semaphore:
+                channel_id = place_part(original_filename, part_index, STORAGE_CHANNELS)
+                async with semaphores[channel_id], buffer_slots:
                     part_name = f"{original_filename}.part{part_index + 1}"
-                    # Read the specific chunk for this task
-                    # Note: This requires careful handling in a real concurrent read scenario,
-                    # but for now we read sequentially and dispatch.
-                    f.seek(part_index * CHUNK_SIZE)
-                    chunk_data = f.read(CHUNK_SIZE)
+                    # Read the specific chunk for this task (positional reads, safe from several threads)
+                    part_offset = part_index * chunk_size
+                    part_length = min(chunk_size, file_size - part_offset)
+
+                    # Sparse/zero regions are recorded as holes (None) instead of being uploaded
+                    if not await loop.run_in_executor(None, range_has_data, f.fileno(), part_offset, part_length):
+                        pbar_overall.update(1)
+                        return part_index, None, None, None
+
+                    chunk_data = await loop.run_in_executor(None, read_range, f.fileno(), part_offset, part_length)
+                    if await loop.run_in_executor(None, is_zero_block, chunk_data):
+                        pbar_overall.update(1)
+                        return part_index, None, None, None
                     
+                    # Hashed while in memory, so a later scrub can verify exactly what was sent
+                    part_hash = await loop.run_in_executor(None, lambda: hashlib.sha256(chunk_data).hexdigest())
                     pbar_chunk = tqdm(total=len(chunk_data), unit='B', unit_scale=True, desc=f"Part {part_index+1}")
                     
-                    message_id = await upload_worker(client, chunk_data, part_name, pbar_chunk)
+                    # Only this part is resent on failure, so its size bounds the retry cost.
+                    for attempt in range(UPLOAD_RETRIES):
+                        try:
+                            message_id = await upload_worker(client, channel_id, chunk_data, part_name, pbar_chunk)
+                            break
+                        except Exception as e:
+                            print(f"\nFailed to upload {part_name} on attempt {attempt + 1}. Error: {e}")
+                            if attempt == UPLOAD_RETRIES - 1:
+                                raise
+                            await asyncio.sleep(10)
                     pbar_overall.update(1)
-                    return part_index, message_id
+                    return part_index, message_id, channel_id, part_hash
 
             for i in range(start_part_index, total_parts):
                 tasks.append(task_creator(i))
@@ -126,14 +236,37 @@ async def upload_file_main(client, file_path):
             # Sort results by part index to ensure correct order
             results.sort(key=lambda x: x[0])
             newly_uploaded_ids = [res[1] for res in results]
+            newly_uploaded_channels = [res[2] for res in results]
+            newly_uploaded_hashes = [res[3] for res in results]
             
             # Combine with already existing IDs if resuming
             final_message_ids = uploaded_part_ids + newly_uploaded_ids
+            final_channels = uploaded_part_channels + newly_uploaded_channels
+            final_part_hashes = uploaded_part_hashes + newly_uploaded_hashes
+
+            # Records the layout in the channel so a catalog rebuild can recreate the holes.
+            try:
+                await client.send_message(
+                    place_part(original_filename, 0, STORAGE_CHANNELS),
+                    layout_marker(original_filename, total_parts, final_message_ids.count(None), file_size, chunk_size)
+                )
+            except Exception as e:
+                print(f"\nWarning: Could not post the layout marker. Error: {e}")
+
+            # The full hash lets later uploads of the same content skip sending it again.
+            print("Hashing file contents for duplicate detection...")
+            file_hash = known_content_hash or await loop.run_in_executor(None, content_hash, file_path)
             
             db[original_filename] = {
                 "message_ids": final_message_ids,
+                "channels": final_channels,
+                # SHA-256 of each stored part as sent, checked by client/scrub.py
+                "part_hashes": final_part_hashes,
                 "total_parts": total_parts,
-                "file_size_bytes": file_size
+                "file_size_bytes": file_size,
+                "chunk_size": chunk_size,
+                "sample_hash": sample_hash,
+                "content_hash": file_hash
             }
             save_db(db)
             pbar_overall.close()
@@ -145,6 +278,7 @@ async def upload_file_main(client, file_path):
         return
 
     print(f"\n✅ Successfully uploaded all parts of '{original_filename}' and finalized the database.")
+    return True
 
 async def main():
     """Main function to connect the client and start the process."""
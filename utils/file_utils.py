@@ -0,0 +1,288 @@
+# utils/file_utils.py
+import os
+import re
+import errno
+import struct
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION & CONSTANTS ---
+# Buffer size used when the kernel fast paths are unavailable and we have to
+# copy through Python. Small enough to keep memory flat, big enough to be fast.
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Largest single request we hand to copy_file_range/sendfile. The kernel caps
+# one call at just under 2 GB anyway, so we loop in steps of this size.
+MAX_KERNEL_COPY = 1024 * 1024 * 1024
+
+# FICLONERANGE from <linux/fs.h>: _IOW(0x94, 13, struct file_clone_range)
+FICLONERANGE = 0x4020940D
+
+# Errors that mean "this fast path is not supported here", not "the copy failed".
+_UNSUPPORTED_ERRNOS = {
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+    errno.ENOTTY, errno.EBADF, errno.EPERM,
+}
+
+_SIZE_UNITS = {
+    "": 1, "b": 1,
+    "k": 1024, "kb": 1024, "kib": 1024,
+    "m": 1024 ** 2, "mb": 1024 ** 2, "mib": 1024 ** 2,
+    "g": 1024 ** 3, "gb": 1024 ** 3, "gib": 1024 ** 3,
+    "t": 1024 ** 4, "tb": 1024 ** 4, "tib": 1024 ** 4,
+}
+
+# Serialises seek+read on platforms without os.pread (Windows).
+_read_range_lock = threading.Lock()
+
+# --- SIZE PARSING ---
+def parse_size(size_str):
+    """Converts a human readable size such as '2gb', '500 MB' or '4.9g' into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", str(size_str))
+    if not match:
+        raise ValueError(f"Invalid size: '{size_str}'")
+    number, unit = match.groups()
+    unit = unit.lower()
+    if unit not in _SIZE_UNITS:
+        raise ValueError(f"Unknown size unit '{unit}' in '{size_str}'")
+    size = int(float(number) * _SIZE_UNITS[unit])
+    if size <= 0:
+        raise ValueError(f"Size must be greater than zero: '{size_str}'")
+    return size
+
+# --- ZERO-COPY TRANSFER ---
+def _clone_range(src_fd, dst_fd, src_offset, count, dst_offset):
+    """Shares the extents of a byte range between two files (reflink). Linux only."""
+    import fcntl
+    args = struct.pack("qQQQ", src_fd, src_offset, count, dst_offset)
+    fcntl.ioctl(dst_fd, FICLONERANGE, args)
+
+def _copy_file_range(src_fd, dst_fd, src_offset, count, dst_offset):
+    copied = 0
+    while copied < count:
+        step = min(count - copied, MAX_KERNEL_COPY)
+        n = os.copy_file_range(src_fd, dst_fd, step, src_offset + copied, dst_offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _sendfile(src_fd, dst_fd, src_offset, count, dst_offset):
+    # sendfile writes at the current position of the destination.
+    os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+    copied = 0
+    while copied < count:
+        step = min(count - copied, MAX_KERNEL_COPY)
+        n = os.sendfile(dst_fd, src_fd, src_offset + copied, step)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+def _buffered_copy(src_fd, dst_fd, src_offset, count, dst_offset):
+    os.lseek(src_fd, src_offset, os.SEEK_SET)
+    os.lseek(dst_fd, dst_offset, os.SEEK_SET)
+    copied = 0
+    while copied < count:
+        data = os.read(src_fd, min(count - copied, COPY_BUFFER_SIZE))
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            written = os.write(dst_fd, view)
+            view = view[written:]
+        copied += len(data)
+    return copied
+
+def copy_range(src_fd, dst_fd, src_offset, count, dst_offset, reflink=False):
+    """
+    Copies `count` bytes from `src_fd` at `src_offset` to `dst_fd` at `dst_offset`.
+
+    The data stays in the kernel wherever possible: a reflink is tried first when
+    requested, then copy_file_range, then sendfile, and only then a small
+    buffered loop. Returns the number of bytes copied, which is less than
+    `count` only if the source ends early.
+    """
+    if count <= 0:
+        return 0
+
+    if reflink and hasattr(os, "copy_file_range"):
+        try:
+            _clone_range(src_fd, dst_fd, src_offset, count, dst_offset)
+            return count
+        except (OSError, ImportError):
+            pass # Unaligned range or no CoW support; fall through to a real copy.
+
+    copied = 0
+    for method in (_copy_file_range, _sendfile, _buffered_copy):
+        if method is _copy_file_range and not hasattr(os, "copy_file_range"):
+            continue
+        if method is _sendfile and not hasattr(os, "sendfile"):
+            continue
+        try:
+            copied += method(src_fd, dst_fd, src_offset + copied, count - copied, dst_offset + copied)
+            return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+    return copied
+
+def copy_file_into(src_path, dst_fd, dst_offset, reflink=False):
+    """Appends the whole of `src_path` into `dst_fd` at `dst_offset`. Returns bytes copied."""
+    src_fd = os.open(src_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(src_fd).st_size
+        return copy_range(src_fd, dst_fd, 0, size, dst_offset, reflink=reflink)
+    finally:
+        os.close(src_fd)
+
+def read_range(fd, offset, length):
+    """
+    Reads up to `length` bytes at `offset` without moving the file position, so
+    several threads can read parts of the same file at once.
+    """
+    if not hasattr(os, "pread"):
+        with _read_range_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, length)
+    chunks = []
+    while length > 0:
+        data = os.pread(fd, min(length, MAX_KERNEL_COPY), offset)
+        if not data:
+            break
+        chunks.append(data)
+        offset += len(data)
+        length -= len(data)
+    return b"".join(chunks)
+
+# --- SPARSE FILE SUPPORT ---
+# Chunks are compared against this many zero bytes at a time (a plain memcmp).
+ZERO_CHECK_BLOCK = 1024 * 1024
+_ZERO_BLOCK = bytes(ZERO_CHECK_BLOCK)
+
+def range_has_data(fd, offset, length):
+    """
+    Asks the filesystem (SEEK_DATA) whether any allocated data lies in the range.
+    Returns True when the filesystem can't tell, so callers fall back to reading
+    the bytes and checking them with is_zero_block().
+    """
+    seek_data = getattr(os, "SEEK_DATA", None)
+    if seek_data is None:
+        return True
+    saved_position = os.lseek(fd, 0, os.SEEK_CUR)
+    try:
+        next_data = os.lseek(fd, offset, seek_data)
+    except OSError as e:
+        # ENXIO means there is no data at all past `offset`.
+        return e.errno != errno.ENXIO
+    finally:
+        os.lseek(fd, saved_position, os.SEEK_SET)
+    return next_data < offset + length
+
+def is_zero_block(data):
+    """Returns True if every byte in `data` is zero."""
+    for start in range(0, len(data), ZERO_CHECK_BLOCK):
+        block = data[start:start + ZERO_CHECK_BLOCK]
+        if block != _ZERO_BLOCK[:len(block)]:
+            return False
+    return True
+
+# --- CONTENT FINGERPRINTS ---
+# Sampled prefilter: this many blocks spread evenly through the file.
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_SIZE = 64 * 1024
+# Full hash: the file is cut into segments that are hashed on separate threads.
+HASH_SEGMENT_SIZE = 64 * 1024 * 1024
+HASH_READ_SIZE = 8 * 1024 * 1024
+HASH_WORKERS = min(8, os.cpu_count() or 4)
+
+def sample_fingerprint(file_path):
+    """Cheap prefilter hash over the file size and a few sampled blocks. Only a hint, never proof."""
+    file_size = os.path.getsize(file_path)
+    h = hashlib.blake2b(str(file_size).encode(), digest_size=16)
+    with open(file_path, 'rb') as f:
+        if file_size <= SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE:
+            h.update(f.read())
+        else:
+            step = (file_size - SAMPLE_BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(i * step)
+                h.update(f.read(SAMPLE_BLOCK_SIZE))
+    return h.hexdigest()
+
+def _hash_segment(file_path, offset, length):
+    h = hashlib.sha256()
+    with open(file_path, 'rb', buffering=0) as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = f.read(min(remaining, HASH_READ_SIZE))
+            if not data:
+                break
+            h.update(data)
+            remaining -= len(data)
+    return h.digest()
+
+def content_hash(file_path, workers=HASH_WORKERS):
+    """
+    Full-content hash used to detect identical files.
+
+    Every HASH_SEGMENT_SIZE segment is hashed with SHA-256 on its own thread
+    (hashlib drops the GIL and OpenSSL uses the CPU's SHA instructions), and the
+    segment digests are then hashed together in order. The result does not
+    depend on the number of workers.
+    """
+    file_size = os.path.getsize(file_path)
+    offsets = range(0, max(file_size, 1), HASH_SEGMENT_SIZE)
+    top = hashlib.sha256()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for digest in executor.map(lambda offset: _hash_segment(file_path, offset, min(HASH_SEGMENT_SIZE, file_size - offset)), offsets):
+            top.update(digest)
+    return "sha256-tree:" + top.hexdigest()
+
+def matches_entry(info, file_path, sample_hash):
+    """
+    Checks whether `file_path` has the content recorded in a catalog entry of the
+    same name. The sample hash rules out most changes cheaply, but an in-place edit
+    of a large file usually misses the sampled blocks, so the full hash decides
+    whenever the entry has one. Returns (matches, content_hash or None).
+    """
+    if info.get("sample_hash") not in (None, sample_hash):
+        return False, None
+    if not info.get("content_hash"):
+        return True, None
+    full_hash = content_hash(file_path)
+    return full_hash == info["content_hash"], full_hash
+
+def build_content_index(db):
+    """
+    Maps (file_size_bytes, sample_hash) to the names of the completely uploaded
+    catalog entries with a known content hash. Built once per loaded catalog.
+    """
+    index = {}
+    for name, info in db.items():
+        records = info.get("messages", info.get("message_ids", []))
+        if info.get("content_hash") and info.get("sample_hash") and len(records) == info.get("total_parts"):
+            index.setdefault((info.get("file_size_bytes"), info["sample_hash"]), []).append(name)
+    return index
+
+def find_duplicate(db, file_path, file_size, sample_hash, index=None, full_hash=None):
+    """
+    Looks for a completely uploaded catalog entry with the same content as `file_path`,
+    using `index` from build_content_index() (built here if not given). The full hash
+    is only computed when an entry matches on size and sampled blocks, and not at all
+    when the caller already has it.
+    Returns (matching_name or None, content_hash or None).
+    """
+    if index is None:
+        index = build_content_index(db)
+    candidates = index.get((file_size, sample_hash))
+    if not candidates:
+        return None, full_hash
+
+    full_hash = full_hash or content_hash(file_path)
+    for name in candidates:
+        if db[name]["content_hash"] == full_hash:
+            return name, full_hash
+    return None, full_hash
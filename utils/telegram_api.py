@@ -0,0 +1,58 @@
+# utils/telegram_api.py
+import re
+import zlib
+
+# --- LAYOUT MARKERS ---
+# Holes (all-zero parts) are never uploaded, so after each upload a short text
+# message records the file's layout. It lets a catalog rebuild tell holes, and
+# trailing holes in particular, apart from parts that are simply missing.
+LAYOUT_MARKER_RE = re.compile(
+    r"^(?P<name>.+)\.layout (?P<total_parts>\d+) parts \((?P<holes>\d+) holes\), "
+    r"(?P<file_size>\d+) bytes, (?P<chunk_size>\d+) bytes per part$"
+)
+
+def layout_marker(file_name, total_parts, holes, file_size, chunk_size):
+    """Returns the text of a layout marker message."""
+    return (f"{file_name}.layout {total_parts} parts ({holes} holes), "
+            f"{file_size} bytes, {chunk_size} bytes per part")
+
+def parse_layout_marker(text):
+    """Returns (name, total_parts, holes, file_size, chunk_size) for a layout marker, otherwise None."""
+    match = LAYOUT_MARKER_RE.match(text.strip())
+    if not match:
+        return None
+    return (match.group("name"), int(match.group("total_parts")), int(match.group("holes")),
+            int(match.group("file_size")), int(match.group("chunk_size")))
+
+# --- STORAGE CHANNELS ---
+def storage_channels(config):
+    """
+    Returns the channels file parts are stored in: CHANNEL_IDS when it is set in
+    the given config module, otherwise just CHANNEL_ID.
+    """
+    return list(getattr(config, "CHANNEL_IDS", None) or [config.CHANNEL_ID])
+
+def known_channels(config):
+    """
+    Returns every channel parts may be found in: CHANNEL_ID, where files uploaded
+    before CHANNEL_IDS was set stay, followed by CHANNEL_IDS, without repeats.
+    """
+    channels = [config.CHANNEL_ID] + list(getattr(config, "CHANNEL_IDS", None) or [])
+    return list(dict.fromkeys(channels))
+
+def place_part(file_name, part_index, channels):
+    """
+    Picks the channel for one part. A file's parts go round-robin over the channels,
+    starting at a position derived from its name, so its parts can be transferred
+    in parallel and different files start on different channels. The choice is
+    deterministic, so a resumed upload places the remaining parts the same way.
+    """
+    start = zlib.crc32(file_name.encode("utf-8"))
+    return channels[(start + part_index) % len(channels)]
+
+def part_channel(info, part_index, default_channel):
+    """Returns the channel a stored part lives in. Entries from before sharding use default_channel."""
+    if "messages" in info:
+        return info["messages"][part_index].get("channel_id", default_channel)
+    channels = info.get("channels")
+    return channels[part_index] if channels else default_channel